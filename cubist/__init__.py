@@ -15,7 +15,8 @@ into existing sklearn-based ML pipelines or scripts for experimenting.
 """
 from .cubist import Cubist
 from .exceptions import CubistError
+from ._make_data_string import clear_data_cache
 
 from .__version__ import __version__
 
-__all__ = ['Cubist', 'CubistError', '__version__']
+__all__ = ['Cubist', 'CubistError', 'clear_data_cache', '__version__']
@@ -0,0 +1,50 @@
+import threading
+import zlib
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+
+# every zstd frame starts with these four bytes, which never begin a zlib
+# stream, so data compressed with either codec can always be told apart
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# zstd contexts are reused between calls but can't be shared across threads
+_contexts = threading.local()
+
+
+def _zstd_compressor():
+    """Return the zstd compression context of the current thread."""
+    if not hasattr(_contexts, "compressor"):
+        _contexts.compressor = zstd.ZstdCompressor(level=3, threads=-1)
+    return _contexts.compressor
+
+
+def _zstd_decompressor():
+    """Return the zstd decompression context of the current thread."""
+    if not hasattr(_contexts, "decompressor"):
+        _contexts.decompressor = zstd.ZstdDecompressor()
+    return _contexts.decompressor
+
+
+def _compress(data: bytes) -> bytes:
+    """Compress data with zstd if available and fall back to zlib."""
+    if zstd is not None:
+        return _zstd_compressor().compress(data)
+    return zlib.compress(data)
+
+
+def _decompress(data: bytes, size: int = None) -> bytes:
+    """Decompress data produced by `_compress` with either codec. The 
+    uncompressed size, if known, lets the output be allocated in one go."""
+    if data[:4] == _ZSTD_MAGIC:
+        if zstd is None:
+            raise ImportError("This model was compressed with zstd. Install "
+                              "the `zstandard` package to use it.")
+        return _zstd_decompressor().decompress(data,
+                                               max_output_size=size or 0)
+    if size is None:
+        return zlib.decompress(data)
+    return zlib.decompress(data, bufsize=max(size, 1))
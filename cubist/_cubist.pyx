@@ -1,20 +1,36 @@
+cimport cython
 cimport numpy as np
+from cpython.bytearray cimport PyByteArray_AsString, PyByteArray_Resize
+from cpython.bytes cimport PyBytes_AS_STRING
+from libc.math cimport isnan, NAN
+from libc.stdio cimport snprintf
+from libc.stdlib cimport calloc, malloc, free
+from libc.string cimport memcpy
 np.import_array()
 
+# upper bound on the number of characters written for one formatted value,
+# including its trailing separator ("%.15g" needs at most 22 characters)
+cdef enum:
+    CELL_WIDTH = 24
+
 # external declarations for cubist and predictions function from the top.c file
 cdef extern from "src/top.c":
-    void cubist(char **namesv, char **datav, int *unbiased,
-                char **compositev, int *neighbors, int *committees,
-                double *sample, int *seed, int *rules, double *extrapolation,
-                int *cv, char **modelv, char **outputv)
-    void predictions(char **casev, char **namesv, char **datav, char **modelv, 
-                     double *predv, char **outputv)
-
-# define the Python functions that interface with the C functions
+    int cubist(char **namesv, char **datav, int *unbiased,
+               char **compositev, int *neighbors, int *committees,
+               double *sample, int *seed, int *rules, double *extrapolation,
+               int *cv, char **modelv, char **outputv)
+    int predictions(char **casev, char **namesv, char **datav, char **modelv, 
+                    double *predv, char **outputv)
+
+# define the Python functions that interface with the C functions. These hold 
+# the GIL during the calls: the C code keeps its state in globals, so two calls 
+# must never run at once, and it allocates the returned strings with PyMem
 def _cubist(namesv_, datav_, unbiased_, compositev_, neighbors_, committees_, 
             sample_, seed_, rules_, extrapolation_, cv_, modelv_, outputv_):
     """
-    Train and return Cubist model and output from C code
+    Train and return Cubist model, output and exit status (0 on success) from 
+    C code. The string arguments may be bytes or bytearray objects, which are 
+    passed to the C code without being copied.
     """
     cdef char *namesv = namesv_;
     cdef char *datav = datav_;
@@ -29,15 +45,21 @@ def _cubist(namesv_, datav_, unbiased_, compositev_, neighbors_, committees_,
     cdef int cv = cv_;
     cdef char *modelv = modelv_;
     cdef char *outputv = outputv_;
-    cubist(&namesv, &datav, &unbiased, &compositev, &neighbors, &committees, 
-           &sample, &seed, &rules, &extrapolation, &cv, &modelv, &outputv);
-    return (modelv, outputv)
+    cdef int status = cubist(&namesv, &datav, &unbiased, &compositev, 
+                             &neighbors, &committees, &sample, &seed, &rules, 
+                             &extrapolation, &cv, &modelv, &outputv)
+    return (modelv, outputv, status)
 
 
-def _predictions(casev_, namesv_, datav_, modelv_, 
-                 np.ndarray[double, ndim=1, mode="c"] predv_, outputv_):
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def _predictions(casev_, namesv_, datav_, modelv_, np.ndarray predv_, 
+                 outputv_):
     """
     Obtain predictions using existing Cubist model and return output if raised
+    along with the exit status (0 on success) of the C code. The predictions 
+    are written into predv_, a contiguous float64 or float32 array, where the 
+    latter is filled from a temporary (zeroed) buffer of doubles.
     Reference: https://scipy-lectures.org/advanced/interfacing_with_c/interfacing_with_c.html#id13
     """
     cdef char *casev = casev_;
@@ -45,6 +67,177 @@ def _predictions(casev_, namesv_, datav_, modelv_,
     cdef char *datav = datav_;
     cdef char *modelv = modelv_;
     cdef char *outputv = outputv_;
-    predictions(&casev, &namesv, &datav, &modelv, 
-                <double*> np.PyArray_DATA(predv_), &outputv);
-    return (predv_, outputv)
+    cdef Py_ssize_t n = predv_.shape[0]
+    cdef Py_ssize_t i
+    cdef int typenum = np.PyArray_TYPE(predv_)
+    cdef bint single = typenum == np.NPY_FLOAT32
+    cdef double *predv
+    cdef float *out
+    cdef int status
+
+    if not np.PyArray_IS_C_CONTIGUOUS(predv_) or predv_.ndim != 1 or \
+            (typenum != np.NPY_FLOAT64 and not single):
+        raise ValueError("predv_ must be a contiguous float64 or float32 "
+                         "vector")
+
+    if single:
+        predv = <double *> calloc(max(n, 1), sizeof(double))
+        if predv == NULL:
+            raise MemoryError()
+    else:
+        predv = <double *> np.PyArray_DATA(predv_)
+
+    status = predictions(&casev, &namesv, &datav, &modelv, predv, &outputv)
+
+    if single:
+        out = <float *> np.PyArray_DATA(predv_)
+        for i in range(n):
+            out[i] = <float> predv[i]
+        free(predv)
+    return (predv_, outputv, status)
+
+
+cdef inline unsigned char _format_value(char *buf, double value):
+    """Format a single value and return the number of characters written. 
+    Missing values are written as "?"."""
+    if isnan(value):
+        buf[0] = b'?'
+        return 1
+    return snprintf(buf, CELL_WIDTH, "%.15g", value)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef bytearray _numeric_data_string(const double[:, ::1] x,
+                                 const double[::1] y=None,
+                                 const double[::1] w=None,
+                                 bint pad_weights=False):
+    """
+    Format a numeric dataset as a Cubist data string where each row contains 
+    the outcome, the features and, if given, the case weight. With 
+    pad_weights, a missing case weight is written instead of w. The 
+    bytearray is NUL-terminated so it can be passed to _cubist and 
+    _predictions without a copy.
+    """
+    cdef bint weighted = w is not None or pad_weights
+    cdef Py_ssize_t nrows = x.shape[0]
+    cdef Py_ssize_t ncols = x.shape[1]
+    cdef Py_ssize_t rowcols = ncols + 1 + weighted
+    cdef Py_ssize_t off = 0
+    cdef Py_ssize_t i, j
+    cdef bint has_y = y is not None
+    cdef bint has_w = w is not None
+    cdef bytearray out
+    cdef char *buf
+
+    if nrows == 0:
+        return bytearray()
+
+    # every value fits in CELL_WIDTH characters so the buffer never has to grow
+    out = bytearray(nrows * rowcols * CELL_WIDTH)
+    buf = PyByteArray_AsString(out)
+
+    for i in range(nrows):
+        off += _format_value(buf + off, y[i] if has_y else NAN)
+        buf[off] = b','
+        off += 1
+        for j in range(ncols):
+            off += _format_value(buf + off, x[i, j])
+            buf[off] = b','
+            off += 1
+        if weighted:
+            off += _format_value(buf + off, w[i] if has_w else NAN)
+            buf[off] = b','
+            off += 1
+        buf[off - 1] = b'\n'
+
+    # drop the final newline
+    PyByteArray_Resize(out, off - 1)
+    return out
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef bytearray _mixed_data_string(list columns, Py_ssize_t nrows):
+    """
+    Format a dataset with numeric and categorical columns as a Cubist data 
+    string of nrows rows. Each column is None if all of its values are 
+    missing, a float64 array if it's numeric or a tuple of the (intp) codes 
+    of its values, its formatted distinct values joined into a bytes object 
+    and the (intp) offsets of each of these in the bytes object. Like 
+    _numeric_data_string, the bytearray is NUL-terminated.
+    """
+    cdef Py_ssize_t ncols = len(columns)
+    cdef Py_ssize_t size = 0
+    cdef Py_ssize_t off = 0
+    cdef Py_ssize_t width, start, i, j, k
+    cdef const double[::1] values
+    cdef const np.intp_t[::1] view
+    cdef const double **nums
+    cdef const np.intp_t **codes
+    cdef const np.intp_t **offsets
+    cdef const char **levels
+    cdef bytearray out
+    cdef char *buf
+
+    if nrows == 0:
+        return bytearray()
+
+    # pointers to the values of each column, all NULL for a missing column
+    nums = <const double **> malloc(ncols * sizeof(double *))
+    codes = <const np.intp_t **> malloc(ncols * sizeof(np.intp_t *))
+    offsets = <const np.intp_t **> malloc(ncols * sizeof(np.intp_t *))
+    levels = <const char **> malloc(ncols * sizeof(char *))
+    try:
+        if nums == NULL or codes == NULL or offsets == NULL or levels == NULL:
+            raise MemoryError()
+
+        for j in range(ncols):
+            column = columns[j]
+            nums[j] = NULL
+            codes[j] = NULL
+            if column is None:
+                size += 2 * nrows
+            elif isinstance(column, tuple):
+                view = column[0]
+                codes[j] = &view[0]
+                levels[j] = PyBytes_AS_STRING(column[1])
+                view = column[2]
+                offsets[j] = &view[0]
+                # make room for the widest value and its separator
+                width = 0
+                for k in range(view.shape[0] - 1):
+                    width = max(width, view[k + 1] - view[k])
+                size += (width + 1) * nrows
+            else:
+                values = column
+                nums[j] = &values[0]
+                size += CELL_WIDTH * nrows
+
+        out = bytearray(size)
+        buf = PyByteArray_AsString(out)
+        for i in range(nrows):
+            for j in range(ncols):
+                if nums[j] != NULL:
+                    off += _format_value(buf + off, nums[j][i])
+                elif codes[j] != NULL:
+                    k = codes[j][i]
+                    start = offsets[j][k]
+                    memcpy(buf + off, levels[j] + start, 
+                           offsets[j][k + 1] - start)
+                    off += offsets[j][k + 1] - start
+                else:
+                    buf[off] = b'?'
+                    off += 1
+                buf[off] = b','
+                off += 1
+            buf[off - 1] = b'\n'
+    finally:
+        free(nums)
+        free(codes)
+        free(offsets)
+        free(levels)
+
+    # drop the final newline
+    PyByteArray_Resize(out, off - 1)
+    return out
@@ -1,101 +1,154 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
 import pandas as pd
-from pandas.api.types import is_string_dtype, is_numeric_dtype
+from pandas.api.types import is_string_dtype, is_numeric_dtype, \
+    is_complex_dtype
 import numpy as np
 
+from _cubist import _numeric_data_string, _mixed_data_string
+
 from ._make_names_string import _escapes
 
 
-def _r_format(x: float, digits: int = 15) -> str:
-    """Python version of the R format function to return a number formatted as a 
-    string rounded to `digits` number of digits from the left."""
-    # if x is NA return NA
-    if pd.isna(x):
-        return x
-    if np.iscomplex(x):
+# numeric training data strings of the last few fits, so that refitting on the
+# same data (e.g. in a hyperparameter search) skips the serialization. These
+# stay alive for the whole process, even after the fitted models are gone or
+# when they don't keep their training data, until clear_data_cache is called
+_DATA_CACHE_SIZE = 4
+_data_cache = OrderedDict()
+_data_cache_lock = threading.Lock()
+
+
+def _numeric_column(x) -> np.ndarray:
+    """Convert a numeric column to contiguous float64 values with NaN for 
+    missing values."""
+    if is_complex_dtype(x):
         raise ValueError("Complex numbers not supported")
+    # columns of a 2-D block can be strided views
+    return np.ascontiguousarray(x.to_numpy(dtype=np.float64, na_value=np.nan),
+                                dtype=np.float64)
+
+
+def _format_strings(x) -> list:
+    """Remove leading whitespace from strings and replace missing values 
+    with ?."""
+    x = (c.lstrip() for c in x)
+    return ["?" if c == "nan" else c for c in x]
 
-    # get the count of whole number digits, i.e. the number of digits to the 
-    # left of the decimal place
-    whole_nums_count = len(str(int(x)))
-    # Where there are decimal places that need to be rounded, round to digits 
-    # - whole_nums_count decimal places
-    if whole_nums_count < digits:
-        remaining_decimals = digits - whole_nums_count
-        return str(round(x, remaining_decimals))
-    # Where there are no decimals that need to/can be rounded
-    return str(x)
 
+def _categorical_column(x, escape=False) -> tuple:
+    """Encode a non-numeric column as the codes of its values and its 
+    formatted (and, if requested, escaped) distinct values joined together 
+    along with the offsets of each of them."""
+    codes, uniques = pd.factorize(x.astype(str))
+    uniques = list(uniques)
+    if escape:
+        uniques = _escapes(uniques)
+    levels = [c.encode() for c in _format_strings(uniques)]
+    offsets = np.zeros(len(levels) + 1, dtype=np.intp)
+    np.cumsum([len(c) for c in levels], out=offsets[1:])
+    return codes.astype(np.intp, copy=False), b"".join(levels), offsets
 
-def _make_data_string(x, y=None, w=None):
+
+def _make_data_string(x, y=None, w=None, pad_weights=False):
     """
     Converts input dataset array X into a string.
 
     Parameters
     ----------
-    x : {pd.DataFrame} of shape (n_samples, n_features)
-        The input samples.
+    x : {pd.DataFrame, np.ndarray} of shape (n_samples, n_features)
+        The input samples. NumPy arrays must be numeric.
 
-    y : pd.Series
+    y : ndarray of shape (n_samples,)
         The predicted values.
     
     w : ndarray of shape (n_samples,)
         Instance weights.
 
+    pad_weights : bool
+        Whether to add a column of missing instance weights in place of w, 
+        as needed to predict with a model trained with instance weights.
+
     Returns
     -------
-    x : str
+    x : {bytes, bytearray}
         Input dataset converted to a string and formatted per Cubist's 
         requirements.
     """
-    x = x.copy(deep=True)
-    
-    # apply the escapes function to all string columns
+    # purely numeric datasets are formatted directly by the C extension
+    if isinstance(x, np.ndarray) or \
+            all(is_numeric_dtype(x[col]) and not is_complex_dtype(x[col])
+                for col in x):
+        if isinstance(x, pd.DataFrame):
+            x = x.to_numpy(dtype=np.float64, na_value=np.nan)
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        if y is not None:
+            y = np.ascontiguousarray(y, dtype=np.float64)
+        if w is not None:
+            w = np.ascontiguousarray(w, dtype=np.float64)
+        return _numeric_data_string(x, y, w, pad_weights)
+
+    # otherwise only the distinct values of the non-numeric columns are 
+    # formatted here and the C extension writes each row, where a missing 
+    # outcome (for model predictions) becomes a column of ?'s
+    columns = [None if y is None else
+               np.ascontiguousarray(y, dtype=np.float64)]
     for col in x:
+        # apply the escapes function to all string columns
         if is_string_dtype(x[col]):
-            x[col] = _escapes(x[col].astype(str))
-
-    # if y is None for model predictions, set y as a column of NaN values, 
-    # # which will become ?'s later
-    if y is None:
-        y = [np.nan] * x.shape[0]
-        y = pd.Series(y)
-    else:
-        y = y.copy(deep=True)
-
-    # format the y column for special charactesrs
-    y = pd.Series(_escapes(y.astype(str)))
-
-    # insert the y column as the first column of x
-    x.insert(0, "y", y)
-
-    # handle weights matrix (?) TODO: validate
-    if w is not None:
-        # [f"w{i}" for i in range(x.shape[1])]
-        column_names = list(x.columns) + ["w"]
-        x = x.assign(w=w)
-        x.columns = column_names
-
-    # convert all columns to strings
-    for col in x:
-        if is_numeric_dtype(x[col]):
-            x[col] = x[col].apply(_r_format)
-            x[col] = x[col].astype(str)
+            columns.append(_categorical_column(x[col], escape=True))
+        elif is_numeric_dtype(x[col]):
+            columns.append(_numeric_column(x[col]))
         else:
-            x[col] = x[col].astype(str)
-
-    # remove leading whitespace from all elements
-    x = x.applymap(lambda a: a.lstrip())
-
-    # replace missing values with ?
-    x = x.fillna("?")
-    x = x.replace("nan", "?")
+            columns.append(_categorical_column(x[col]))
 
-    # convert dataframe to list of lists
-    x = x.to_numpy().tolist()
-
-    # merge each sublist into single strings with entries separated by commas
-    x = [','.join(row) for row in x]
-
-    # join all row strings into a single string separated by \n's
-    x = "\n".join(x)
-    return x
+    # add the weights as the last column
+    if w is not None:
+        columns.append(np.ascontiguousarray(w, dtype=np.float64))
+    elif pad_weights:
+        columns.append(None)
+    return _mixed_data_string(columns, x.shape[0])
+
+
+def _data_cache_key(x, y=None, w=None):
+    """Hash the buffers of the numeric inputs to a data string."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(memoryview(x))
+    for a in (y, w):
+        h.update(b"\0" if a is None else memoryview(a))
+    return x.shape, y is None, w is None, h.digest()
+
+
+def _cached_data_string(x, y=None, w=None):
+    """Same as `_make_data_string` for a C-contiguous float64 array, but reuse
+    the data string of a recent call on identical inputs. The strings are 
+    immutable bytes since they are shared by every model fit on the same 
+    data."""
+    if y is not None:
+        y = np.ascontiguousarray(y, dtype=np.float64)
+    if w is not None:
+        w = np.ascontiguousarray(w, dtype=np.float64)
+    key = _data_cache_key(x, y, w)
+    with _data_cache_lock:
+        if key in _data_cache:
+            _data_cache.move_to_end(key)
+            return _data_cache[key]
+    data_string = bytes(_numeric_data_string(x, y, w))
+    with _data_cache_lock:
+        _data_cache[key] = data_string
+        if len(_data_cache) > _DATA_CACHE_SIZE:
+            _data_cache.popitem(last=False)
+    return data_string
+
+
+def clear_data_cache():
+    """Free the training data strings cached by previous fits.
+
+    The strings of the last four numeric training sets are kept for the whole
+    process, including those of models that have since been deleted or that 
+    don't keep their training data, so this releases their memory.
+    """
+    with _data_cache_lock:
+        _data_cache.clear()
@@ -1,3 +1,4 @@
+from functools import lru_cache
 import re
 import sys
 from datetime import datetime
@@ -8,15 +9,23 @@ import numpy as np
 from ._quinlan_attributes import _quinlan_attributes
 
 
-def _make_names_string(x, w=None, label="outcome"):
+# column names starting with the reserved name "sample" are renamed
+_SAMPLE_NAME = re.compile("^sample")
+# and get their names back in the model attributes and the rows of the 
+# attribute usage table
+_RENAMED_SAMPLE = re.compile(r'(att="|^\t  .{4}   .{4}    )_Sample',
+                             re.MULTILINE)
+
+
+def _make_names_string(x, w=None, label="outcome", columns=None):
     """
     Create the names string to pass to Cubist. This string contains information about Python and the time of run along
     with the column names and their data types.
 
     Parameters
     ----------
-    x : {pd.DataFrame} of shape (n_samples, n_features)
-        The input samples.
+    x : {pd.DataFrame, np.ndarray} of shape (n_samples, n_features)
+        The input samples. NumPy arrays must be numeric.
 
     w : ndarray of shape (n_samples,)
         Instance weights.
@@ -24,45 +33,68 @@ def _make_names_string(x, w=None, label="outcome"):
     label : str, default="outcome"
         A label for the outcome variable. This is only used for printing rules.
 
+    columns : list, default=None
+        Column names of x when it is a NumPy array.
+
     Returns
     -------
     out : str
         Case name string describing training dataset columns and their types.
     """
-    # copy Pandas objects so they aren't changed outside of this function
-    x = x.copy(deep=True)
-
-    # clean reserved sample name if it's in x
-    has_sample = [i for i, c in enumerate(x.columns) if bool(re.search('^sample', c))]
-    if has_sample:
-        x.columns = [re.sub('^sample', '_Sample', c) for c in x.columns]
-
     # generate the comments string showing the Python version and current timestamps
     python_version = tuple(sys.version_info)
     now = datetime.now()
     out = f'| Generated using Python {python_version[0]}.{python_version[1]}.{python_version[2]}\n' \
           f'| on {now.strftime("%a %b %d %H:%M:%S %Y")}'
 
+    # all columns of a numeric array are continuous, so their descriptions 
+    # only depend on the column names and are reused between fits
+    if isinstance(x, np.ndarray):
+        attributes = _continuous_attributes(label, tuple(columns),
+                                            w is not None)
+    else:
+        attributes = _attributes(label, _quinlan_attributes(x), w is not None)
+
+    # merge the comments and attributes strings
+    return f'{out}\n{attributes}'
+
+
+def _attributes(label, var_data, weighted):
+    """Describe the outcome and the columns, given as a dictionary of their 
+    names and data types, in the names string."""
     # define the outcome data type
     outcome_type = ": continuous."
 
     # build base out string
-    out = f'{out}\n{label}.\n{label}{outcome_type}'
+    out = f'{label}.\n{label}{outcome_type}'
 
-    # get dictionary of feature names as keys and data types as values
-    var_data = _quinlan_attributes(x)
+    # clean reserved sample name if it's in x
+    var_data = {_SAMPLE_NAME.sub('_Sample', key): value
+                for key, value in var_data.items()}
 
     # if weights are present add this to var_data
-    if w is not None:
+    if weighted:
         var_data["case weight"] = "continuous."
 
     # join the column names and data types into a single string
-    var_data = [f'{_escapes([key])[0]}: {value}' for key, value in var_data.items()]
+    var_data = [f'{key}: {value}' for key, value
+                in zip(_escapes(list(var_data)), var_data.values())]
     var_data = '\n'.join(var_data)
 
     # merge the out and var_data strings
-    out = f'{out}\n{var_data}\n'
-    return out
+    return f'{out}\n{var_data}\n'
+
+
+@lru_cache(maxsize=32)
+def _continuous_attributes(label, columns, weighted):
+    """Same as `_attributes` for columns that are all continuous."""
+    return _attributes(label, dict.fromkeys(columns, "continuous."), weighted)
+
+
+def _restore_sample_names(x):
+    """Give the columns renamed from the reserved sample name their original 
+    names back in the model or its attribute usage table."""
+    return _RENAMED_SAMPLE.sub(r"\1sample", x)
 
 
 def _escapes(x, chars=None):
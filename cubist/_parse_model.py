@@ -30,7 +30,9 @@ def _split_to_groups(x, f):
     return groups
 
 
-def _parse_model(model, x):
+def _number_model_rows(model):
+    """Split the model into its non-empty rows and find the committee and 
+    rule number of each row."""
     # split on newline
     model = model.split("\n")
     # remove empty strings
@@ -74,6 +76,14 @@ def _parse_model(model, x):
             c_idx += 1
             # set the current condition number
             cond_num[i] = c_idx
+    return model, com_num, rule_num
+
+
+def _parse_rules(model, x):
+    """Parse the rule conditions of a model into a table along with the 
+    fraction of the training data x covered by each condition."""
+    model, com_num, rule_num = _number_model_rows(model)
+    model_len = len(model)
 
     split_var = [None] * model_len
     split_val = [None] * model_len
@@ -118,9 +128,11 @@ def _parse_model(model, x):
             "category": split_cats,
             "type": split_type
         })
-        # remove missing values based on the variable column
-        split_data = split_data.dropna(subset=['variable'])
-        split_data = split_data.reset_index(drop=True)
+        # remove missing values based on the variable column, only building a
+        # new index if any rows were dropped
+        has_variable = split_data["variable"].notna()
+        if not has_variable.all():
+            split_data = split_data[has_variable].reset_index(drop=True)
         
         # get the percentage of data covered by this rule
         nrows = x.shape[0]
@@ -135,18 +147,23 @@ def _parse_model(model, x):
                     # evaluate and get the percentage of data
                     comp_total = OPERATORS[comp_operator](x_col, var_value).sum()
                     split_data.loc[i, "percentile"] = comp_total / nrows
-    
+    return split_data
+
+
+def _parse_coefficients(model, var_names):
+    """Parse the regression coefficients of each rule of a model."""
+    model, com_num, rule_num = _number_model_rows(model)
+
     # get the indices of rows in model that contain model coefficients
     is_eqn = [i for i, c in enumerate(model) if "coeff=" in c]
     # extract the model coefficients from the row
-    coefs = [_eqn(model[i], var_names=list(x.columns)) for i in is_eqn]
+    coefs = [_eqn(model[i], var_names=var_names) for i in is_eqn]
     out = pd.DataFrame(coefs)
     # get the committee number
     out["committee"] = [com_num[i] for i in is_eqn]
     # get the rule number for the committee
     out["rule"] = [rule_num[i] for i in is_eqn]
-
-    return split_data, out
+    return out
 
 
 def _type2(x, dig=3):
@@ -1,4 +1,5 @@
-import zlib
+from functools import cached_property
+import re
 from warnings import warn
 
 import numpy as np
@@ -9,13 +10,29 @@ from sklearn.base import RegressorMixin, BaseEstimator
 
 from _cubist import _cubist, _predictions
 
-from ._make_names_string import _make_names_string
-from ._make_data_string import _make_data_string
-from ._parse_model import _parse_model
-from ._variable_usage import _get_variable_usage
+from ._compression import _compress, _decompress
+from ._make_names_string import _make_names_string, _SAMPLE_NAME, \
+    _restore_sample_names
+from ._make_data_string import _make_data_string, _cached_data_string
+from ._parse_model import _parse_rules, _parse_coefficients
+from ._variable_usage import _get_usage_section, _get_variable_usage
 from .exceptions import CubistError
 
 
+# fitted attributes that are parsed from the model on first access
+_PARSED_ATTRIBUTES = ("rules_", "_parse_inputs", "coeff_",
+                      "feature_importances_", "variables_")
+
+# notices in the output of the C code start with "***", where the details of
+# some of them follow on indented lines
+_NOTICE = re.compile(rb"^\*\*\*.*(?:\n[ \t]+\S.*)*", re.MULTILINE)
+
+
+def _is_numeric(x):
+    """Whether a validated input array holds only (non-complex) numbers."""
+    return x.dtype.kind in "biuf"
+
+
 class Cubist(BaseEstimator, RegressorMixin):
     """
     Cubist Regression Model (Public v2.07) developed by Quinlan.
@@ -77,16 +94,22 @@ class Cubist(BaseEstimator, RegressorMixin):
     verbose : int, default=0
         Should the Cubist output be printed?
 
+    compress_model : bool, default=False
+        Should the names and training data strings be compressed after model 
+        training? This saves memory at the cost of compressing them after 
+        training and decompressing them for the first prediction. They are 
+        always compressed when the model is pickled.
+
     Attributes
     ----------
-    names_string_ : str
+    names_string_ : bytes
         String for the Cubist model that describes the training dataset column 
         names and their data types. This also provides some Python environment 
-        information.
+        information. Compressed if `compress_model=True`.
     
-    data_string_ : str
+    data_string_ : bytes
         String containing the training data. Required for using instance-based
-        corrections and compressed after model training.
+        corrections and compressed if `compress_model=True`.
 
     model_ : str
         The Cubist model string generated by the C code.
@@ -135,7 +158,8 @@ class Cubist(BaseEstimator, RegressorMixin):
                  cv: int = None,
                  random_state: int = None,
                  target_label: str = "outcome",
-                 verbose: int = 0):
+                 verbose: int = 0,
+                 compress_model: bool = False):
         super().__init__()
 
         self.n_rules = n_rules
@@ -149,6 +173,7 @@ class Cubist(BaseEstimator, RegressorMixin):
         self.random_state = random_state
         self.target_label = target_label
         self.verbose = verbose
+        self.compress_model = compress_model
 
     def _more_tags(self):
         """scikit-learn estimator configuration method
@@ -249,6 +274,14 @@ class Cubist(BaseEstimator, RegressorMixin):
             return self.cv
         return 0
 
+    def _check_compress_model(self):
+        # validate the compress_model option
+        if not isinstance(self.compress_model, bool):
+            raise ValueError("Wrong input for parameter `compress_model`. "
+                             "Expected True or False, got "
+                             f"{self.compress_model}")
+        return self.compress_model
+
     def fit(self, X, y, sample_weight=None):
         """Build a Cubist regression model from training set (X, y).
 
@@ -300,6 +333,7 @@ class Cubist(BaseEstimator, RegressorMixin):
         extrapolation = self._check_extrapolation()
         sample = self._check_sample(X.shape[0])
         cv = self._check_cv()
+        compress_model = self._check_compress_model()
         random_state = check_random_state(self.random_state)
 
         # number of input features
@@ -307,93 +341,245 @@ class Cubist(BaseEstimator, RegressorMixin):
         # number of outputs is 1 (single output regression)
         self.n_outputs_ = 1
 
-        # (re)construct a dataframe from X
-        X = pd.DataFrame(X, columns=self.feature_names_in_)
-        y = pd.Series(y)
-
-        # create the names and data strings required for cubist
-        names_string = _make_names_string(X, w=sample_weight,
-                                          label=self.target_label)
-        data_string = _make_data_string(X, y, w=sample_weight)
+        y = np.ascontiguousarray(y, dtype=np.float64)
+
+        # numeric data is serialized straight from a contiguous array while
+        # other data needs a dataframe for the per-column formatting
+        if _is_numeric(X):
+            X = np.ascontiguousarray(X, dtype=np.float64)
+            names_string = _make_names_string(X, w=sample_weight,
+                                              label=self.target_label,
+                                              columns=self.feature_names_in_)
+            data_string = _cached_data_string(X, y, w=sample_weight)
+            X = pd.DataFrame(X, columns=self.feature_names_in_, copy=False)
+        else:
+            X = pd.DataFrame(X, columns=self.feature_names_in_)
+            names_string = _make_names_string(X, w=sample_weight,
+                                              label=self.target_label)
+            data_string = _make_data_string(X, y, w=sample_weight)
 
         # call the C implementation of cubist
-        model, output = _cubist(namesv_=names_string.encode(),
-                                datav_=data_string.encode(),
-                                unbiased_=unbiased,
-                                compositev_=composite.encode(),
-                                neighbors_=neighbors,
-                                committees_=n_committees,
-                                sample_=sample,
-                                seed_=random_state.randint(0, 4095) % 4096,
-                                rules_=n_rules,
-                                extrapolation_=extrapolation,
-                                cv_=cv,
-                                modelv_=b"1",
-                                outputv_=b"1")
-
-        # convert output from raw to strings
+        model, output, status = _cubist(
+            namesv_=names_string.encode(),
+            datav_=data_string,
+            unbiased_=unbiased,
+            compositev_=composite.encode(),
+            neighbors_=neighbors,
+            committees_=n_committees,
+            sample_=sample,
+            seed_=random_state.randint(0, 4095) % 4096,
+            rules_=n_rules,
+            extrapolation_=extrapolation,
+            cv_=cv,
+            modelv_=b"1",
+            outputv_=b"1")
+
+        # drop the attributes parsed from a previous model
+        for attr in _PARSED_ATTRIBUTES:
+            self.__dict__.pop(attr, None)
+
+        # convert the model from raw to a string, while the output is only
+        # decoded where it's needed
         self.model_ = model.decode()
-        output = output.decode()
 
-        # raise Cubist training errors
-        if ("***" in output) or ("Error" in output):
-            raise CubistError(output)
+        # raise Cubist training errors, in which case the C code exits with a
+        # nonzero status
+        if status:
+            raise CubistError(output.decode(errors="replace"))
+
+        # otherwise its notices are only warnings, e.g. when the number of 
+        # cross-validation folds is reduced
+        if b"***" in output:
+            for notice in _NOTICE.findall(output):
+                warn(notice.decode(errors="replace"), stacklevel=3)
 
         # inform user that they may want to use rules only
-        if "Recommend using rules only" in output:
+        if b"Recommend using rules only" in output:
             warn("Cubist recommends using rules only "
                  "(i.e. set auto=False)", stacklevel=3)
 
         # print model output if using verbose output
         if self.verbose:
-            print(output)
+            print(output.decode(errors="replace"))
 
         # if the model returned nothing, we're doing cross-validation so stop
         if self.model_ == "1":
             return self
 
-        # replace "__Sample" with "sample" if this is used in the model
-        if "\n__Sample" in names_string:
-            output = output.replace("__Sample", "sample")
-            self.model_ = self.model_.replace("__Sample", "sample")
-            # clean model string when using reserved sample name
-            self.model_ = self.model_[:self.model_.index("sample")] + \
-                          self.model_[self.model_.index("entries"):]
+        # columns starting with the reserved name "sample" are written as 
+        # "_Sample" in the names string. The model keeps these names since 
+        # predict passes it to the C code with the names string, while the 
+        # parsed tables use the original column names
+        parsed_model = self.model_
+        sample_renamed = any(_SAMPLE_NAME.match(str(c))
+                             for c in self.feature_names_in_)
+        if sample_renamed:
+            parsed_model = _restore_sample_names(parsed_model)
 
         # when a composite model has not been used, drop the data_string
         if not (
                 (composite == "yes") or
-                ("nearest neighbors" in output) or
+                (b"nearest neighbors" in output) or
                 (neighbors > 0)
         ):
-            data_string = "1"
+            data_string = b"1"
+
+        # save descriptors/data along with their sizes, only compressing them
+        # here if requested and otherwise when the model is pickled
+        names_string = names_string.encode()
+        data_string = bytes(data_string)
+        self._string_sizes = (len(names_string), len(data_string))
+        self._compressed = compress_model
+        if self._compressed:
+            names_string = _compress(names_string)
+            data_string = _compress(data_string)
+        self.names_string_ = names_string
+        self.data_string_ = data_string
+        # the raw model is kept here for predict, which also caches the 
+        # decompressed copies of the above here
+        self._decompressed_cache = {"model": model}
+
+        # parse the rules, which need the training data to find how much of it
+        # each rule covers
+        self.rules_ = _parse_rules(parsed_model, X)
+
+        # keep what is needed to parse the other model contents when they are
+        # first accessed, where only the usage section of the output is needed.
+        # If the section is missing, the whole output is decoded for
+        # _get_usage_section to raise the error
+        start = max(output.find(b"\tAttribute usage"), 0)
+        usage = _get_usage_section(output[start:].decode(errors="replace"))
+        if sample_renamed:
+            usage = _restore_sample_names(usage)
+        self._parse_inputs = (parsed_model, usage,
+                              list(self.feature_names_in_))
+        return self
 
-        # compress and save descriptors/data
-        self.names_string_ = zlib.compress(names_string.encode())
-        self.data_string_ = zlib.compress(data_string.encode())
+    @cached_property
+    def coeff_(self):
+        """Table of the regression coefficients found by the Cubist model."""
+        model, _, columns = self._parse_inputs
+        return _parse_coefficients(model, columns)
 
-        # parse model contents and store useful information
-        self.rules_, self.coeff_ = _parse_model(self.model_, X)
+    @cached_property
+    def feature_importances_(self):
+        """Table of how training data variables are used in the Cubist model.
+        """
+        _, usage, columns = self._parse_inputs
+        return _get_variable_usage(usage, columns)
+
+    @cached_property
+    def variables_(self):
+        """Information about all the variables passed to the model and those 
+        that were actually used."""
+        if self.rules_ is None:
+            raise AttributeError("variables_ is not available for models "
+                                 "without rule conditions")
+
+        # get the names of columns that have no nan values, skipping the first
+        # three since these are always filled
+        not_na_idx = np.flatnonzero(self.coeff_.notna().to_numpy().all(axis=0))
+        not_na_cols = self.coeff_.columns.to_numpy()[not_na_idx][3:].tolist()
 
-        # get the input data variable usage
-        self.feature_importances_ = _get_variable_usage(output, X)
+        # store a dictionary containing all the training dataset columns and 
+        # those that were used by the model
+        used_variables = pd.Index(self.rules_["variable"].unique()).union(
+            not_na_cols, sort=False
+        )
+        return {"all": list(self.feature_names_in_),
+                "used": used_variables.tolist()}
+
+    def _get_model_strings(self):
+        """Return the decompressed names and training data strings along with
+        the encoded model. These are only prepared on the first call and 
+        reused by later predictions.
+        """
+        # the cache is updated in place so predict doesn't change __dict__
+        cache = self._decompressed_cache
+        if "names" not in cache:
+            if self._compressed:
+                names_size, data_size = self._string_sizes
+                cache["names"] = _decompress(self.names_string_, names_size)
+                cache["data"] = _decompress(self.data_string_, data_size)
+            else:
+                cache["names"] = self.names_string_
+                cache["data"] = self.data_string_
+        # unpickled models have to encode the model again
+        if "model" not in cache:
+            cache["model"] = self.model_.encode()
+        return cache["names"], cache["data"], cache["model"]
+
+    def __getstate__(self):
+        # copy the state since it may be the instance __dict__ itself
+        state = dict(super().__getstate__())
+        # don't pickle the decompressed strings along with the compressed ones
+        state.pop("_decompressed_cache", None)
+        # and compress the strings of models that kept them uncompressed
+        if state.get("_compressed") is False:
+            state["names_string_"] = _compress(self.names_string_)
+            state["data_string_"] = _compress(self.data_string_)
+            state["_compressed"] = True
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # models pickled before the string sizes were stored decompress their
+        # strings without them, and these models always compressed them
+        if "names_string_" in state:
+            self.__dict__.setdefault("_string_sizes", (None, None))
+            self.__dict__.setdefault("_compressed", True)
+        # as well as the default for parameters added since then
+        self.__dict__.setdefault("compress_model", False)
+        # unpickled models start with an empty cache
+        self._decompressed_cache = {}
+
+    def _make_predict_data_string(self, X):
+        """Validate the input samples and convert them to a data string. Also
+        return the number of samples and the dtype of their predictions."""
+        # validate input data
+        X = self._validate_data(X,
+                                dtype=None,
+                                force_all_finite='allow-nan',
+                                reset=False)
 
-        # get the names of columns that have no nan values
-        is_na_col = ~self.coeff_.isna().any()
-        not_na_cols = self.coeff_.columns[is_na_col].tolist()
+        # make data string for predictions, skipping the dataframe for numeric
+        # data. If there are case weights used during training, the C code will 
+        # expect a column of weights in the new data but the values will be 
+        # ignored.
+        # predictions for float32 samples are returned as float32
+        dtype = np.float32 if X.dtype == np.float32 else np.float64
+        if _is_numeric(X):
+            X = np.ascontiguousarray(X, dtype=np.float64)
+        else:
+            X = pd.DataFrame(X, columns=self.feature_names_in_)
+        # a weighted model expects a (missing) case weight for each sample
+        data_string = _make_data_string(X,
+                                        pad_weights=self.is_sample_weighted_)
+        return data_string, X.shape[0], dtype
+
+    def _predict_data_string(self, data_string, n_samples, dtype):
+        """Get the predictions for `n_samples` rows in a data string from the 
+        C code, which writes them straight into an array of `dtype`."""
+        # get cubist predictions from trained model. The buffer is zeroed
+        # since models fit on a sample only predict the cases held out from 
+        # it, leaving the remaining predictions unset
+        names_string, train_data_string, model = self._get_model_strings()
+        pred, output, status = _predictions(data_string,
+                                            names_string,
+                                            train_data_string,
+                                            model,
+                                            np.zeros(n_samples, dtype=dtype),
+                                            b"1")
+
+        # raise Cubist prediction errors, decoding the output only if there is
+        # anything to show
+        if status:
+            raise CubistError(output.decode(errors="replace"))
 
-        # skip the first three since these are always filled
-        not_na_cols = not_na_cols[3:]
+        if output:
+            print(output.decode(errors="replace"))
 
-        # store a dictionary containing all the training dataset columns and 
-        # those that were used by the model
-        if self.rules_ is not None:
-            used_variables = set(self.rules_["variable"]).union(
-                set(not_na_cols)
-            )
-            self.variables_ = {"all": list(self.feature_names_in_),
-                               "used": list(used_variables)}
-        return self
+        return pred
 
     def predict(self, X):
         """Predict Cubist regression target for X.
@@ -407,45 +593,46 @@ class Cubist(BaseEstimator, RegressorMixin):
         Returns
         -------
         y : ndarray of shape (n_samples,)
-            The predicted values.
+            The predicted values, as float32 for float32 input samples and
+            float64 otherwise. The C code computes them in double precision, 
+            so float32 predictions are rounded to single precision.
         """
         # make sure the model has been fitted
-        check_is_fitted(self, attributes=["model_", "rules_", "coeff_",
-                                          "feature_importances_"])
-
-        # validate input data
-        X = self._validate_data(X,
-                                dtype=None,
-                                force_all_finite='allow-nan',
-                                reset=False)
-
-        # (re)construct a dataframe from X
-        X = pd.DataFrame(X, columns=self.feature_names_in_)
+        check_is_fitted(self, attributes=["model_", "rules_"])
 
-        # If there are case weights used during training, the C code will expect 
-        # a column of weights in the new data but the values will be ignored.
-        if self.is_sample_weighted_:
-            X["case_weight_pred"] = np.nan
+        data_string, n_samples, dtype = self._make_predict_data_string(X)
+        return self._predict_data_string(data_string, n_samples, dtype)
 
-        # make data string for predictions
-        data_string = _make_data_string(X)
+    def predict_batch(self, X_list):
+        """Predict Cubist regression targets for several batches of samples.
 
-        # get cubist predictions from trained model
-        pred, output = _predictions(data_string.encode(),
-                                    zlib.decompress(self.names_string_),
-                                    zlib.decompress(self.data_string_),
-                                    self.model_.encode(),
-                                    np.zeros(X.shape[0]),
-                                    b"1")
+        The C code parses the model and training data on every call, which 
+        dominates the cost of predicting small batches. Here all batches are 
+        predicted with a single call instead of one call per batch.
 
-        # decode output
-        output = output.decode()
-
-        # raise Cubist prediction errors
-        if "***" in output or "Error" in output:
-            raise CubistError(output)
-
-        if output:
-            print(output)
+        Parameters
+        ----------
+        X_list : list of {array-like} of shape (n_samples_i, n_features)
+            The batches of input samples. Each must have complete column names
+            or none provided at all.
 
-        return pred
+        Returns
+        -------
+        y : list of ndarray of shape (n_samples_i,)
+            The predicted values of each batch.
+        """
+        # make sure the model has been fitted
+        check_is_fitted(self, attributes=["model_", "rules_"])
+
+        batches = [self._make_predict_data_string(X) for X in X_list]
+        if not batches:
+            return []
+        data_strings, n_samples, dtypes = zip(*batches)
+
+        # predict all rows at once and split them back into their batches, 
+        # which are only cast if the batches mix float32 and other samples
+        pred = self._predict_data_string(b"\n".join(data_strings),
+                                         sum(n_samples),
+                                         np.result_type(*dtypes))
+        return [p.astype(dtype, copy=False) for p, dtype in
+                zip(np.split(pred, np.cumsum(n_samples)[:-1]), dtypes)]
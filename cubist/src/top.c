@@ -9,10 +9,14 @@ extern void cubistmain(void);
 extern void samplemain(double *outputv);
 extern void FreeCases(void);
 
-static void cubist(char **namesv, char **datav, int *unbiased,
-                   char **compositev, int *neighbors, int *committees,
-                   double *sample, int *seed, int *rules, double *extrapolation,
-                   int *cv, char **modelv, char **outputv) {
+/*
+ * Both entry points return 0 on success and otherwise the status that the C
+ * code passed to exit/rbm_exit, in which case outputv holds the error message.
+ */
+static int cubist(char **namesv, char **datav, int *unbiased,
+                  char **compositev, int *neighbors, int *committees,
+                  double *sample, int *seed, int *rules, double *extrapolation,
+                  int *cv, char **modelv, char **outputv) {
   int val; /* Used by setjmp/longjmp for implementing rbm_exit */
 
   // Initialize the globals to the values that the cubist
@@ -43,10 +47,11 @@ static void cubist(char **namesv, char **datav, int *unbiased,
   // Register this strbuf using the name "undefined.names"
   rbm_register(sb_names, "undefined.names", 1);
 
-  // Create a strbuf using *datav and register it as "undefined.data"
+  // Create a strbuf using *datav and register it as "undefined.data".
+  // The data file is only ever opened for reading, so like *namesv it is
+  // used in place rather than copied.
   STRBUF *sb_datav = strbuf_create_full(*datav, strlen(*datav));
-  // XXX why is sb_datav copied? what that part of my debugging?
-  rbm_register(strbuf_copy(sb_datav), "undefined.data", 1);
+  rbm_register(sb_datav, "undefined.data", 1);
 
   /*
    * We need to initialize rbm_buf before calling any code that
@@ -78,10 +83,12 @@ static void cubist(char **namesv, char **datav, int *unbiased,
 
   // We reinitialize the globals on exit out of general paranoia
   initglobals();
+
+  return val ? val - JMP_OFFSET : 0;
 }
 
-static void predictions(char **casev, char **namesv, char **datav,
-                        char **modelv, double *predv, char **outputv) {
+static int predictions(char **casev, char **namesv, char **datav,
+                       char **modelv, double *predv, char **outputv) {
   int val; /* Used by setjmp/longjmp for implementing rbm_exit */
 
   // Initialize the globals
@@ -99,9 +106,9 @@ static void predictions(char **casev, char **namesv, char **datav,
   STRBUF *sb_names = strbuf_create_full(*namesv, strlen(*namesv));
   rbm_register(sb_names, "undefined.names", 1);
 
+  // The training data is only read, so it isn't copied (see cubist above)
   STRBUF *sb_datav = strbuf_create_full(*datav, strlen(*datav));
-  // /* XXX why is sb_datav copied? */
-  rbm_register(strbuf_copy(sb_datav), "undefined.data", 1);
+  rbm_register(sb_datav, "undefined.data", 1);
 
   STRBUF *sb_modelv = strbuf_create_full(*modelv, strlen(*modelv));
   /* XXX should sb_modelv be copied? */
@@ -115,9 +122,7 @@ static void predictions(char **casev, char **namesv, char **datav,
     // Real work is done here
     samplemain(predv);
 
-  } //else {
-    // printf("prediction code called exit with value %d\n", val - JMP_OFFSET);
-  // }
+  }
 
   // Close file object "Of", and return its contents via argument outputv
   char *outputString = closeOf();
@@ -127,4 +132,6 @@ static void predictions(char **casev, char **namesv, char **datav,
 
   // We reinitialize the globals on exit out of general paranoia
   initglobals();
+
+  return val ? val - JMP_OFFSET : 0;
 }
@@ -0,0 +1,26 @@
+import zlib
+
+import pytest
+
+from .. import _compression
+from .._compression import _compress, _decompress
+
+
+data = b"1.5,2,?\n3.25,4,5" * 100
+
+
+@pytest.mark.parametrize("use_zstd", [True, False])
+def test_round_trip(use_zstd, monkeypatch):
+    if use_zstd:
+        pytest.importorskip("zstandard")
+    else:
+        monkeypatch.setattr(_compression, "zstd", None)
+    assert _decompress(_compress(data)) == data
+    assert _decompress(_compress(data), len(data)) == data
+
+
+def test_decompress_zlib():
+    # models compressed with zlib can always be read back
+    assert _decompress(zlib.compress(data)) == data
+    # a wrong size only changes the initial output buffer
+    assert _decompress(zlib.compress(data), 10) == data
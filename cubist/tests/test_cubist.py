@@ -1,11 +1,17 @@
 from contextlib import contextmanager
+import pickle
 
 import pytest
 
+import numpy as np
 import pandas as pd
 from sklearn.utils.validation import check_is_fitted
 
+from _cubist import _predictions
+
+from .. import cubist as cubist_module
 from ..cubist import Cubist
+from ..exceptions import CubistError
 
 titanic = pd.read_csv("https://raw.githubusercontent.com/mwaskom/seaborn-data/master/raw/titanic.csv")
 titanic = titanic.drop(["name", "ticket"], axis=1)
@@ -77,6 +83,18 @@ def test_unbiased(unbiased, raises):
         check_is_fitted(model)
 
 
+@pytest.mark.parametrize("compress_model,raises",
+                         [(True, no_raise()),
+                          (False, no_raise()),
+                          (None, pytest.raises(ValueError)),
+                          ("no", pytest.raises(ValueError))])
+def test_compress_model(compress_model, raises):
+    model = Cubist(compress_model=compress_model)
+    with raises:
+        model.fit(X, y)
+        check_is_fitted(model)
+
+
 @pytest.mark.parametrize("extrapolation,raises",
                          [(0.0, no_raise()),
                           (1.0, no_raise()),
@@ -115,6 +133,13 @@ def test_cv(cv, expected, raises):
         check_is_fitted(model)
 
 
+def test_cv_folds_reduced():
+    # notices of the C code that don't stop training are raised as warnings
+    X_small = X[["pclass", "age"]].iloc[:8]
+    with pytest.warns(UserWarning, match="folds reduced to number of cases"):
+        Cubist(cv=10).fit(X_small, y.iloc[:8])
+
+
 @pytest.mark.parametrize("auto,expected,n,raises",
                          [(True, "auto", 5, no_raise()),
                           (False, "yes", 5, no_raise()),
@@ -140,3 +165,132 @@ def test_missing_column_name(raises):
     with raises:
         model.fit(X_changed_cols, y)
         check_is_fitted(model)
+
+
+@pytest.mark.parametrize("compress_model", [True, False])
+def test_repeated_predictions(compress_model):
+    model = Cubist(neighbors=3, compress_model=compress_model)
+    model.fit(X, y)
+    assert type(model.data_string_) is bytes
+    pred = model.predict(X)
+    # later predictions reuse the decompressed training strings
+    assert np.array_equal(pred, model.predict(X))
+    # which aren't pickled, so unpickled models decompress them again
+    assert "_decompressed_cache" not in model.__getstate__()
+    assert model._decompressed_cache
+    restored = pickle.loads(pickle.dumps(model))
+    assert not restored._decompressed_cache
+    # the strings are always pickled compressed
+    assert restored._compressed
+    assert len(restored.names_string_) < model._string_sizes[0]
+    assert np.array_equal(pred, restored.predict(X))
+
+
+def test_unpickle_old_model():
+    model = Cubist(neighbors=3)
+    model.fit(X, y)
+    pred = model.predict(X)
+    # models pickled by older versions don't have the string sizes, the 
+    # compression flag or the compress_model parameter
+    state = model.__getstate__()
+    for attr in ("_string_sizes", "_compressed", "compress_model"):
+        del state[attr]
+    restored = Cubist.__new__(Cubist)
+    restored.__setstate__(state)
+    assert np.array_equal(pred, restored.predict(X))
+    assert restored.get_params()["compress_model"] is False
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_sample_predictions(dtype, monkeypatch):
+    X_num = X[["pclass", "age", "sibsp", "parch"]].to_numpy(dtype=dtype)
+    model = Cubist(sample=0.5, random_state=0)
+    model.fit(X_num, y)
+    # the C code only predicts the cases held out from the sample, which are 
+    # written first, so predict must hand it a zeroed buffer
+    buffers = []
+
+    def predictions(*args):
+        buffers.append(args[4].copy())
+        return _predictions(*args)
+
+    monkeypatch.setattr(cubist_module, "_predictions", predictions)
+    pred = model.predict(X_num)
+    assert not buffers[0].any()
+    n_predicted = np.count_nonzero(pred)
+    assert 0 < n_predicted < len(pred)
+    assert not pred[n_predicted:].any()
+    # float32 predictions are filled from a temporary buffer, which is zeroed
+    # too instead of keeping what the output held
+    data_string, n_samples, _ = model._make_predict_data_string(X_num)
+    out = np.full(n_samples, 7.0, dtype=np.float32)
+    _predictions(data_string, *model._get_model_strings(), out, b"1")
+    np.testing.assert_array_equal(out, pred.astype(np.float32))
+
+
+def test_sample_column():
+    # columns starting with the reserved name "sample" are renamed for the C 
+    # code, but the parsed tables use their original names
+    X_sample = X[["pclass", "age", "sibsp"]].rename(
+        columns={"pclass": "sample"})
+    model = Cubist()
+    model.fit(X_sample, y)
+    assert "sample" in set(model.rules_["variable"])
+    assert "sample" in model.coeff_.columns
+    assert set(model.feature_importances_["Variable"]) == set(X_sample.columns)
+    pred = model.predict(X_sample)
+    restored = pickle.loads(pickle.dumps(model))
+    assert np.array_equal(pred, restored.predict(X_sample))
+
+
+def test_predict_batch():
+    model = Cubist()
+    model.fit(X, y)
+    batches = [X.iloc[:10], X.iloc[10:15], X.iloc[15:40]]
+    preds = model.predict_batch(batches)
+    assert len(preds) == len(batches)
+    for batch, pred in zip(batches, preds):
+        assert np.array_equal(pred, model.predict(batch))
+
+
+def test_lazy_model_attributes():
+    model = Cubist()
+    model.fit(X, y)
+    # the rules are parsed during fit and keep their variable names as strings
+    assert model.rules_["variable"].dtype == object
+    # the coefficients and variable usage are parsed on first access
+    assert "coeff_" not in vars(model)
+    assert "(Intercept)" in model.coeff_.columns
+    assert set(model.feature_importances_["Variable"]) == set(X.columns)
+    assert "coeff_" in vars(model)
+    # refitting discards the previously parsed attributes
+    model.fit(X.drop(["age"], axis=1), y)
+    assert "coeff_" not in vars(model)
+    assert "age" not in model.coeff_.columns
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_prediction_dtype(dtype):
+    X_num = X[["pclass", "age", "sibsp", "parch"]].to_numpy(dtype=dtype)
+    model = Cubist()
+    model.fit(X_num, y)
+    assert model.predict(X_num).dtype == dtype
+    # float32 predictions are the float64 ones rounded to single precision
+    pred = model.predict(X_num.astype(np.float64))
+    np.testing.assert_array_equal(model.predict(X_num),
+                                  pred.astype(dtype))
+    # and batches keep the dtype of their own samples
+    batches = model.predict_batch([X_num, X_num.astype(np.float64)])
+    assert [p.dtype for p in batches] == [dtype, np.float64]
+    np.testing.assert_array_equal(batches[1], pred)
+
+
+def test_cubist_errors():
+    # variable names in the model output aren't mistaken for errors
+    model = Cubist()
+    model.fit(X.rename(columns={"age": "Error"}), y)
+    # while errors raised by the C code are
+    model.model_ = "garbage"
+    model._decompressed_cache.clear()
+    with pytest.raises(CubistError):
+        model.predict(X.rename(columns={"age": "Error"}))
@@ -0,0 +1,67 @@
+import pytest
+
+import pandas as pd
+import numpy as np
+
+from .. import _make_data_string as mds
+from .._make_data_string import _make_data_string, _cached_data_string, \
+    clear_data_cache
+
+
+numeric_df = pd.DataFrame({"a": [1.5, np.nan, -3.0],
+                           "b": [10, 20, 30]})
+numeric_y = pd.Series([0.25, 1e-07, 123456789.0])
+weights = np.array([1.0, 0.5, 2.0])
+
+
+@pytest.mark.parametrize("y,w,expected",
+                         [(None, None, b"?,1.5,10\n?,?,20\n?,-3,30"),
+                          (numeric_y, None,
+                           b"0.25,1.5,10\n1e-07,?,20\n123456789,-3,30"),
+                          (numeric_y, weights,
+                           b"0.25,1.5,10,1\n1e-07,?,20,0.5\n"
+                           b"123456789,-3,30,2")])
+def test_numeric_data_string(y, w, expected):
+    assert _make_data_string(numeric_df, y, w=w) == expected
+
+
+@pytest.mark.parametrize("x", [numeric_df, numeric_df.assign(c="u")])
+def test_pad_weights(x):
+    padded = _make_data_string(x, pad_weights=True)
+    assert padded == _make_data_string(x, w=np.full(x.shape[0], np.nan))
+    assert all(row.endswith(b",?") for row in padded.split(b"\n"))
+
+
+def test_mixed_data_string():
+    x = numeric_df.assign(c=["u", "v", np.nan])
+    rows = _make_data_string(x, numeric_y).decode().split("\n")
+    assert len(rows) == 3
+    assert rows[0].endswith(",u")
+    assert rows[2].endswith(",?")
+    # the numeric columns of a 2-D block are strided views of it
+    x = pd.DataFrame(np.arange(6.).reshape(3, 2))
+    x["c"] = ["u", "v", np.nan]
+    assert _make_data_string(x) == b"?,0,1,u\n?,2,3,v\n?,4,5,?"
+
+
+def test_cached_data_string():
+    clear_data_cache()
+    x = np.ascontiguousarray(numeric_df, dtype=np.float64)
+    first = _cached_data_string(x, numeric_y, w=weights)
+    # cached strings are shared, so they must be immutable
+    assert type(first) is bytes
+    assert first == _make_data_string(numeric_df, numeric_y, w=weights)
+    # identical inputs reuse the cached string while any change misses
+    assert _cached_data_string(x.copy(), numeric_y, w=weights) \
+        is first
+    assert _cached_data_string(x, numeric_y) is not first
+    assert len(mds._data_cache) == 2
+    clear_data_cache()
+    assert not mds._data_cache
+
+
+def test_categorical_data_string():
+    # distinct values are escaped and stripped once and repeated per row
+    x = numeric_df.assign(c=["a:b", " a:b", "c"])
+    assert _make_data_string(x) == \
+        b"?,1.5,10,a\\\\\\:b\n?,?,20,a\\\\\\:b\n?,-3,30,c"
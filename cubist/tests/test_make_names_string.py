@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from .._make_names_string import _make_names_string, _continuous_attributes, \
+    _restore_sample_names
+
+
+columns = ["a", "sample", "c:d"]
+
+
+def test_continuous_names_string():
+    x = np.zeros((2, 3))
+    names = _make_names_string(x, w=np.ones(2), columns=columns)
+    assert names.endswith("outcome.\noutcome: continuous.\n"
+                          "a: continuous.\n_Sample: continuous.\n"
+                          "c\\\\\\:d: continuous.\ncase weight: continuous.\n")
+    # numeric arrays describe their columns like all-numeric dataframes
+    frame_names = _make_names_string(pd.DataFrame(x, columns=columns),
+                                     w=np.ones(2))
+    assert names.split("\n", 2)[2] == frame_names.split("\n", 2)[2]
+
+
+def test_continuous_attributes_reused():
+    _continuous_attributes.cache_clear()
+    for _ in range(3):
+        _make_names_string(np.zeros((2, 3)), columns=columns)
+    assert _continuous_attributes.cache_info().hits == 2
+
+
+def test_restore_sample_names():
+    # only attribute names are restored, not other mentions of _Sample
+    model = 'type="2" att="_Sample" cut="1" result=">"\ncomment="_Sample"'
+    assert _restore_sample_names(model) == \
+        'type="2" att="sample" cut="1" result=">"\ncomment="_Sample"'
+    usage = "\t  Conds  Model\n\n\t  100%    50%    _Sample_x\n" \
+            "\t          10%    _Sample\n"
+    assert _restore_sample_names(usage) == \
+        "\t  Conds  Model\n\n\t  100%    50%    sample_x\n" \
+        "\t          10%    sample\n"
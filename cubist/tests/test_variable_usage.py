@@ -0,0 +1,24 @@
+import pytest
+
+from .._variable_usage import _get_variable_usage
+
+
+columns = ["pclass", "sibsp", "parch", "age"]
+output = ("\n\n\tAttribute usage:\n"
+          "\t  Conds  Model\n\n"
+          "\t  100%    78%    pclass\n"
+          "\t         100%    sibsp\n"
+          "\t   11%           parch\n"
+          "\n\nTime: 0.0 secs\n")
+
+
+def test_get_variable_usage():
+    usage = _get_variable_usage(output, columns)
+    assert usage["Variable"].tolist() == ["pclass", "sibsp", "parch", "age"]
+    assert usage["Conditions"].tolist() == [100.0, 0.0, 11.0, 0.0]
+    assert usage["Model"].tolist() == [78.0, 100.0, 0.0, 0.0]
+
+
+def test_missing_variable_usage():
+    with pytest.raises(ValueError):
+        _get_variable_usage("Time: 0.0 secs\n", columns)
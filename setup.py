@@ -47,6 +47,7 @@ setup(
     zip_safe=False,
     include_package_data=True,
     install_requires=requires,
+    extras_require={"zstd": ["zstandard"]},
     url="https://github.com/pjaselin/Cubist",
     packages=["cubist"],
     license="GPL v3",